@@ -1,19 +1,23 @@
 from __future__ import annotations
 
-import json
+import os
 import time
-import uuid
 from typing import Any, AsyncIterator
 
 from app.core.generation import generate_response_text, stream_response_deltas
-from app.core.token_estimation import estimate_tokens
+from app.core.prompt import build_conversation_prompt
+from app.core.serialization import JSON_SLOT, dumps_json, split_json_template
+from app.core.token_estimation import (
+    estimate_joined_tokens,
+    estimate_tokens,
+    estimate_tokens_from_char_count,
+)
 from app.core.types import CANONICAL_MODEL_ID, NormalizedGenerationRequest
 
 from .errors import AnthropicCompatError, map_anthropic_error
 from .schemas import (
     CountTokensRequest,
     MessageContentBlock,
-    MessagesMessage,
     MessagesRequest,
 )
 
@@ -39,8 +43,7 @@ async def create_messages_response(
     request: MessagesRequest,
 ) -> tuple[dict[str, Any], list[str]]:
     resolved_model, warnings = _resolve_model(request.model)
-    instructions = _extract_system_text(request.system)
-    prompt = _flatten_messages(request.messages)
+    instructions, prompt, input_tokens = _build_prompt_and_count(request)
 
     normalized = NormalizedGenerationRequest(
         resolved_model=resolved_model,
@@ -54,7 +57,6 @@ async def create_messages_response(
     except Exception as exc:
         raise map_anthropic_error(exc) from exc
 
-    input_tokens = estimate_input_tokens_from_messages(request)
     output_tokens = estimate_tokens(str(content))
 
     payload = {
@@ -78,8 +80,7 @@ async def create_messages_stream(
     request: MessagesRequest,
 ) -> tuple[AsyncIterator[bytes], list[str]]:
     resolved_model, warnings = _resolve_model(request.model)
-    instructions = _extract_system_text(request.system)
-    prompt = _flatten_messages(request.messages)
+    instructions, prompt, input_tokens = _build_prompt_and_count(request)
 
     normalized = NormalizedGenerationRequest(
         resolved_model=resolved_model,
@@ -90,10 +91,9 @@ async def create_messages_stream(
 
     message_id = _new_message_id()
     created_at = int(time.time())
-    input_tokens = estimate_input_tokens_from_messages(request)
 
     async def _iterator() -> AsyncIterator[bytes]:
-        output_tokens = 0
+        output_chars = 0
 
         try:
             start_event = {
@@ -113,35 +113,15 @@ async def create_messages_stream(
                     "created_at": created_at,
                 },
             }
-            yield _anthropic_sse_event("message_start", start_event)
-
-            block_start_event = {
-                "type": "content_block_start",
-                "index": 0,
-                "content_block": {
-                    "type": "text",
-                    "text": "",
-                },
-            }
-            yield _anthropic_sse_event("content_block_start", block_start_event)
+            # Frames that are always sent back to back go out as one chunk.
+            yield (
+                _anthropic_sse_event("message_start", start_event)
+                + _CONTENT_BLOCK_START_EVENT
+            )
 
             async for delta in stream_response_deltas(normalized):
-                output_tokens += estimate_tokens(delta)
-                delta_event = {
-                    "type": "content_block_delta",
-                    "index": 0,
-                    "delta": {
-                        "type": "text_delta",
-                        "text": delta,
-                    },
-                }
-                yield _anthropic_sse_event("content_block_delta", delta_event)
-
-            block_stop_event = {
-                "type": "content_block_stop",
-                "index": 0,
-            }
-            yield _anthropic_sse_event("content_block_stop", block_stop_event)
+                output_chars += len(delta)
+                yield _anthropic_text_delta_event(delta)
 
             message_delta_event = {
                 "type": "message_delta",
@@ -150,12 +130,14 @@ async def create_messages_stream(
                     "stop_sequence": None,
                 },
                 "usage": {
-                    "output_tokens": output_tokens,
+                    "output_tokens": estimate_tokens_from_char_count(output_chars),
                 },
             }
-            yield _anthropic_sse_event("message_delta", message_delta_event)
-
-            yield _anthropic_sse_event("message_stop", {"type": "message_stop"})
+            yield (
+                _CONTENT_BLOCK_STOP_EVENT
+                + _anthropic_sse_event("message_delta", message_delta_event)
+                + _MESSAGE_STOP_EVENT
+            )
 
         except Exception as exc:
             mapped = map_anthropic_error(exc)
@@ -177,52 +159,35 @@ def count_tokens(request: CountTokensRequest) -> dict[str, int]:
     return {"input_tokens": input_tokens}
 
 
-def estimate_input_tokens_from_messages(request: MessagesRequest) -> int:
-    text_parts: list[str] = []
-
-    system_text = _extract_system_text(request.system)
-    if system_text:
-        text_parts.append(system_text)
-
-    for message in request.messages:
-        text_parts.append(_extract_content_text(message.content))
-
-    return estimate_tokens("\n".join(text_parts))
-
-
 def estimate_input_tokens_from_count_request(request: CountTokensRequest) -> int:
-    text_parts: list[str] = []
-
     system_text = _extract_system_text(request.system)
-    if system_text:
-        text_parts.append(system_text)
+    part_count = len(request.messages) + (1 if system_text else 0)
+    char_count = len(system_text) if system_text else 0
 
     for message in request.messages:
-        text_parts.append(_extract_content_text(message.content))
+        char_count += len(_extract_content_text(message.content))
 
-    return estimate_tokens("\n".join(text_parts))
+    return estimate_joined_tokens(char_count, part_count)
 
 
 def _resolve_model(model: str) -> tuple[str, list[str]]:
-    if model in _MODEL_ALIASES:
-        resolved = _MODEL_ALIASES[model]
-        warnings: list[str] = []
-        if model != resolved:
-            warnings.append(f"Mapped model '{model}' to backend model '{resolved}'.")
-        return resolved, warnings
-
-    if model.startswith("claude-"):
+    resolved = _MODEL_ALIASES.get(model)
+    if resolved is None and model.startswith("claude-"):
         resolved = CANONICAL_MODEL_ID
-        return resolved, [f"Mapped model '{model}' to backend model '{resolved}'."]
-
-    raise AnthropicCompatError(
-        status_code=400,
-        message=(
-            f"Unknown model '{model}'. Supported aliases: "
-            "sonnet, opus, haiku, claude-*, apple.fm.system."
-        ),
-        error_type="invalid_request_error",
-    )
+
+    if resolved is None:
+        raise AnthropicCompatError(
+            status_code=400,
+            message=(
+                f"Unknown model '{model}'. Supported aliases: "
+                "sonnet, opus, haiku, claude-*, apple.fm.system."
+            ),
+            error_type="invalid_request_error",
+        )
+
+    if model == resolved:
+        return resolved, []
+    return resolved, [f"Mapped model '{model}' to backend model '{resolved}'."]
 
 
 def _extract_system_text(system: str | list[MessageContentBlock] | None) -> str | None:
@@ -232,36 +197,37 @@ def _extract_system_text(system: str | list[MessageContentBlock] | None) -> str
     if isinstance(system, str):
         return system.strip() or None
 
-    blocks = [_parse_block(block, field_name="system") for block in system]
-    merged = "".join(blocks).strip()
+    merged = _join_text_blocks(system, field_name="system").strip()
     return merged or None
 
 
-def _flatten_messages(messages: list[MessagesMessage]) -> str:
-    if not messages:
+def _build_prompt_and_count(
+    request: MessagesRequest,
+) -> tuple[str | None, str, int]:
+    instructions = _extract_system_text(request.system)
+
+    if not request.messages:
         raise AnthropicCompatError(
             status_code=400,
             message="messages must contain at least one item.",
             error_type="invalid_request_error",
         )
 
+    token_char_count = len(instructions) if instructions else 0
+    token_part_count = len(request.messages) + (1 if instructions else 0)
     dialogue_lines: list[str] = []
 
-    for index, message in enumerate(messages):
+    for index, message in enumerate(request.messages):
         text = _extract_content_text(
             message.content, field_name=f"messages[{index}].content"
         )
+        token_char_count += len(text)
         label = "User" if message.role == "user" else "Assistant"
         dialogue_lines.append(f"{label}: {text}" if text else f"{label}:")
 
-    dialogue = "\n".join(dialogue_lines)
-    prompt = (
-        "Use the following conversation history to produce the next assistant message.\n\n"
-        "Conversation:\n"
-        f"{dialogue}\n\n"
-        "Assistant:"
-    )
-    return prompt
+    prompt = build_conversation_prompt(dialogue_lines)
+    input_tokens = estimate_joined_tokens(token_char_count, token_part_count)
+    return instructions, prompt, input_tokens
 
 
 def _extract_content_text(
@@ -272,8 +238,21 @@ def _extract_content_text(
     if isinstance(content, str):
         return content.strip()
 
-    blocks = [_parse_block(block, field_name=field_name) for block in content]
-    return "".join(blocks).strip()
+    return _join_text_blocks(content, field_name=field_name).strip()
+
+
+def _join_text_blocks(blocks: list[MessageContentBlock], *, field_name: str) -> str:
+    texts = [
+        block.text
+        for block in blocks
+        if block.type == "text" and block.text is not None
+    ]
+    if len(texts) != len(blocks):
+        # Only invalid requests get here; re-walk to report the first bad block.
+        for block in blocks:
+            _parse_block(block, field_name=field_name)
+
+    return "".join(texts)
 
 
 def _parse_block(block: MessageContentBlock, *, field_name: str) -> str:
@@ -298,22 +277,53 @@ def _parse_block(block: MessageContentBlock, *, field_name: str) -> str:
 
 
 def _new_message_id() -> str:
-    return f"msg_{uuid.uuid4().hex}"
+    return "msg_" + os.urandom(16).hex()
 
 
 def _anthropic_sse_event(event: str, payload: dict[str, Any]) -> bytes:
-    serialized = json.dumps(payload, ensure_ascii=False)
-    return f"event: {event}\ndata: {serialized}\n\n".encode("utf-8")
+    return b"".join(
+        (b"event: ", event.encode(), b"\ndata: ", dumps_json(payload), b"\n\n")
+    )
 
 
-def _dedupe_preserve_order(items: list[str]) -> list[str]:
-    seen: set[str] = set()
-    deduped: list[str] = []
+def _anthropic_text_delta_event(text: str) -> bytes:
+    return _TEXT_DELTA_EVENT_PREFIX + dumps_json(text) + _TEXT_DELTA_EVENT_SUFFIX
 
-    for item in items:
-        if item in seen:
-            continue
-        seen.add(item)
-        deduped.append(item)
 
-    return deduped
+# Frames with constant payloads are encoded once at import time.
+_CONTENT_BLOCK_START_EVENT = _anthropic_sse_event(
+    "content_block_start",
+    {
+        "type": "content_block_start",
+        "index": 0,
+        "content_block": {
+            "type": "text",
+            "text": "",
+        },
+    },
+)
+_CONTENT_BLOCK_STOP_EVENT = _anthropic_sse_event(
+    "content_block_stop",
+    {
+        "type": "content_block_stop",
+        "index": 0,
+    },
+)
+_MESSAGE_STOP_EVENT = _anthropic_sse_event("message_stop", {"type": "message_stop"})
+_TEXT_DELTA_EVENT_PREFIX, _TEXT_DELTA_EVENT_SUFFIX = split_json_template(
+    _anthropic_sse_event(
+        "content_block_delta",
+        {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {
+                "type": "text_delta",
+                "text": JSON_SLOT,
+            },
+        },
+    )
+)
+
+
+def _dedupe_preserve_order(items: list[str]) -> list[str]:
+    return list(dict.fromkeys(items))
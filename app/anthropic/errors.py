@@ -5,7 +5,7 @@ import importlib.util
 from dataclasses import dataclass
 from typing import Any
 
-from app.core.errors import GatewayError
+from app.core.errors import GatewayError, lookup_fm_error
 
 fm: Any = None
 if importlib.util.find_spec("apple_fm_sdk") is not None:
@@ -29,6 +29,26 @@ class AnthropicCompatError(Exception):
         }
 
 
+def build_fm_error_table(sdk: Any) -> dict[type, tuple[int, str]]:
+    """Map SDK exception classes to (status_code, error_type)."""
+
+    return {
+        sdk.ExceededContextWindowSizeError: (400, "invalid_request_error"),
+        sdk.InvalidGenerationSchemaError: (400, "invalid_request_error"),
+        sdk.UnsupportedGuideError: (400, "invalid_request_error"),
+        sdk.GuardrailViolationError: (400, "invalid_request_error"),
+        sdk.RefusalError: (400, "invalid_request_error"),
+        sdk.RateLimitedError: (429, "rate_limit_error"),
+        sdk.ConcurrentRequestsError: (429, "rate_limit_error"),
+        sdk.AssetsUnavailableError: (503, "api_error"),
+        sdk.GenerationError: (500, "api_error"),
+        sdk.FoundationModelsError: (500, "api_error"),
+    }
+
+
+_FM_ERROR_MAP = build_fm_error_table(fm) if HAS_APPLE_FM_SDK else {}
+
+
 def map_anthropic_error(exc: Exception) -> AnthropicCompatError:
     if isinstance(exc, AnthropicCompatError):
         return exc
@@ -47,30 +67,9 @@ def map_anthropic_error(exc: Exception) -> AnthropicCompatError:
             error_type=error_type,
         )
 
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.ExceededContextWindowSizeError):
-        return AnthropicCompatError(400, str(exc), "invalid_request_error")
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.InvalidGenerationSchemaError, fm.UnsupportedGuideError)
-    ):
-        return AnthropicCompatError(400, str(exc), "invalid_request_error")
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.GuardrailViolationError, fm.RefusalError)
-    ):
-        return AnthropicCompatError(400, str(exc), "invalid_request_error")
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.RateLimitedError, fm.ConcurrentRequestsError)
-    ):
-        return AnthropicCompatError(429, str(exc), "rate_limit_error")
-
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.AssetsUnavailableError):
-        return AnthropicCompatError(503, str(exc), "api_error")
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.GenerationError, fm.FoundationModelsError)
-    ):
-        return AnthropicCompatError(500, str(exc), "api_error")
+    mapped = lookup_fm_error(exc, _FM_ERROR_MAP)
+    if mapped is not None:
+        status_code, error_type = mapped
+        return AnthropicCompatError(status_code, str(exc), error_type)
 
     return AnthropicCompatError(500, f"Unexpected server error: {exc}", "api_error")
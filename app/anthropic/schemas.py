@@ -9,14 +9,14 @@ class MessageContentBlock(BaseModel):
     type: str
     text: str | None = None
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="ignore")
 
 
 class MessagesMessage(BaseModel):
     role: Literal["user", "assistant"]
     content: str | list[MessageContentBlock]
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="ignore")
 
 
 class MessagesRequest(BaseModel):
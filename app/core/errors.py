@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+from collections.abc import Mapping
 from dataclasses import dataclass
+from typing import TypeVar
+
+_T = TypeVar("_T")
 
 
 @dataclass
@@ -12,3 +16,14 @@ class GatewayError(Exception):
 
     def __str__(self) -> str:
         return self.message
+
+
+def lookup_fm_error(exc: BaseException, table: Mapping[type, _T]) -> _T | None:
+    """Return the ``table`` entry for the nearest class in ``exc``'s MRO."""
+
+    for cls in type(exc).__mro__:
+        mapped = table.get(cls)
+        if mapped is not None:
+            return mapped
+
+    return None
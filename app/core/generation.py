@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import functools
 import importlib
 import importlib.util
+import inspect
+import time
 from typing import Any, AsyncIterator
 
+import anyio.to_thread
+
 from .errors import GatewayError
 from .types import CANONICAL_MODEL_ID, NormalizedGenerationRequest
 
@@ -12,15 +17,21 @@ if importlib.util.find_spec("apple_fm_sdk") is not None:
     fm = importlib.import_module("apple_fm_sdk")
 HAS_APPLE_FM_SDK = fm is not None
 
+# How long an is_available() result is reused before probing the model again.
+# Unavailable results expire too, so the gateway recovers once assets load.
+_AVAILABILITY_TTL_SECONDS = 5.0
+_availability: tuple[float, bool, Any] | None = None
+
 
 async def generate_response_text(request: NormalizedGenerationRequest) -> str:
     _validate_request(request)
     session = _create_session(request)
 
     if request.json_schema is None:
-        return await session.respond(request.conversation_prompt)
+        return await _respond(session, request.conversation_prompt)
 
-    generated = await session.respond(
+    generated = await _respond(
+        session,
         request.conversation_prompt,
         json_schema=request.json_schema,
     )
@@ -44,6 +55,9 @@ async def stream_response_deltas(
 
     session = _create_session(request)
 
+    # Snapshots are cumulative, so each delta is whatever follows the previous
+    # snapshot. A snapshot that does not extend the previous one is treated as
+    # a restart and emitted whole.
     previous_snapshot = ""
     async for snapshot in session.stream_response(request.conversation_prompt):
         if snapshot.startswith(previous_snapshot):
@@ -57,6 +71,17 @@ async def stream_response_deltas(
             yield delta
 
 
+async def _respond(session: Any, prompt: str, **kwargs: Any) -> Any:
+    # A synchronous respond() would block the event loop for the whole
+    # generation, so run it on a worker thread instead.
+    if inspect.iscoroutinefunction(session.respond):
+        return await session.respond(prompt, **kwargs)
+
+    return await anyio.to_thread.run_sync(
+        functools.partial(session.respond, prompt, **kwargs)
+    )
+
+
 def _validate_request(request: NormalizedGenerationRequest) -> None:
     if request.resolved_model != CANONICAL_MODEL_ID:
         raise GatewayError(
@@ -80,8 +105,8 @@ def _create_session(
             code="model_unavailable",
         )
 
-    model = fm.SystemLanguageModel()
-    is_available, reason = model.is_available()
+    model = _get_system_model()
+    is_available, reason = _check_availability(model)
 
     if not is_available:
         reason_name = getattr(reason, "name", str(reason) if reason else "UNKNOWN")
@@ -98,3 +123,28 @@ def _create_session(
         return fm.LanguageModelSession(instructions=request.instructions, model=model)
 
     return fm.LanguageModelSession(model=model)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_system_model() -> Any:
+    return fm.SystemLanguageModel()
+
+
+def reset_model_cache() -> None:
+    """Forget the cached system model and availability result."""
+
+    global _availability
+
+    _availability = None
+    _get_system_model.cache_clear()
+
+
+def _check_availability(model: Any) -> tuple[bool, Any]:
+    global _availability
+
+    now = time.monotonic()
+    if _availability is None or now - _availability[0] >= _AVAILABILITY_TTL_SECONDS:
+        is_available, reason = model.is_available()
+        _availability = (now, is_available, reason)
+
+    return _availability[1], _availability[2]
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+# Both the OpenAI and Anthropic adapters wrap the flattened dialogue in the
+# same envelope, so every prompt starts with an identical prefix.
+CONVERSATION_PROMPT_PREFIX = (
+    "Use the following conversation history to produce the next assistant message.\n\n"
+    "Conversation:\n"
+)
+CONVERSATION_PROMPT_SUFFIX = "\n\nAssistant:"
+
+
+def build_conversation_prompt(dialogue_lines: list[str]) -> str:
+    return (
+        CONVERSATION_PROMPT_PREFIX
+        + "\n".join(dialogue_lines)
+        + CONVERSATION_PROMPT_SUFFIX
+    )
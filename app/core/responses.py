@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from .serialization import dumps_json
+
+
+class GatewayJSONResponse(JSONResponse):
+    """JSON response rendered through ``dumps_json`` (orjson when installed)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import json
+from typing import Any
+
+orjson: Any = None
+if importlib.util.find_spec("orjson") is not None:
+    orjson = importlib.import_module("orjson")
+HAS_ORJSON = orjson is not None
+
+
+def dumps_json(payload: Any) -> bytes:
+    """Serialize ``payload`` to compact UTF-8 JSON, via orjson when installed."""
+
+    if HAS_ORJSON:
+        return orjson.dumps(payload)
+
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+# Stands in for the one value that varies between otherwise identical payloads.
+JSON_SLOT = "__json_slot__"
+_ENCODED_SLOT = dumps_json(JSON_SLOT)
+
+
+def split_json_template(encoded: bytes) -> tuple[bytes, bytes]:
+    """Split encoded bytes around ``JSON_SLOT`` so only the slot is re-encoded."""
+
+    head, tail = encoded.split(_ENCODED_SLOT)
+    return head, tail
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
-import math
-
 
 def estimate_tokens(text: str) -> int:
-    if not text:
+    return estimate_tokens_from_char_count(len(text))
+
+
+def estimate_tokens_from_char_count(char_count: int) -> int:
+    if char_count <= 0:
         return 0
 
-    return max(1, math.ceil(len(text) / 4))
+    # Ceiling division by 4; any non-empty text counts as at least one token.
+    return (char_count + 3) // 4
+
+
+def estimate_joined_tokens(char_count: int, part_count: int) -> int:
+    """Estimate tokens for ``part_count`` texts joined by one-char separators."""
+
+    return estimate_tokens_from_char_count(char_count + max(0, part_count - 1))
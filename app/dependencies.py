@@ -2,9 +2,9 @@ from __future__ import annotations
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
 from app.anthropic.errors import AnthropicCompatError
+from app.core.responses import GatewayJSONResponse
 from app.openai.errors import OpenAICompatError
 
 
@@ -13,8 +13,8 @@ def register_exception_handlers(app: FastAPI) -> None:
     async def handle_openai_error(
         _request: Request,
         exc: OpenAICompatError,
-    ) -> JSONResponse:
-        return JSONResponse(
+    ) -> GatewayJSONResponse:
+        return GatewayJSONResponse(
             status_code=exc.status_code,
             content={"error": exc.to_error()},
         )
@@ -23,8 +23,9 @@ def register_exception_handlers(app: FastAPI) -> None:
     async def handle_validation_error(
         request: Request,
         exc: RequestValidationError,
-    ) -> JSONResponse:
-        first_error = exc.errors()[0]["msg"] if exc.errors() else "Invalid request"
+    ) -> GatewayJSONResponse:
+        errors = exc.errors()
+        first_error = errors[0]["msg"] if errors else "Invalid request"
 
         if request.url.path.startswith("/v1/messages"):
             compat_error = AnthropicCompatError(
@@ -32,7 +33,7 @@ def register_exception_handlers(app: FastAPI) -> None:
                 message=first_error,
                 error_type="invalid_request_error",
             )
-            return JSONResponse(
+            return GatewayJSONResponse(
                 status_code=compat_error.status_code,
                 content=compat_error.to_error(),
             )
@@ -43,7 +44,7 @@ def register_exception_handlers(app: FastAPI) -> None:
             error_type="invalid_request_error",
             code="invalid_request",
         )
-        return JSONResponse(
+        return GatewayJSONResponse(
             status_code=compat_error.status_code,
             content={"error": compat_error.to_error()},
         )
@@ -52,8 +53,8 @@ def register_exception_handlers(app: FastAPI) -> None:
     async def handle_anthropic_error(
         _request: Request,
         exc: AnthropicCompatError,
-    ) -> JSONResponse:
-        return JSONResponse(
+    ) -> GatewayJSONResponse:
+        return GatewayJSONResponse(
             status_code=exc.status_code,
             content=exc.to_error(),
         )
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 
+from app.core.responses import GatewayJSONResponse
 from app.dependencies import register_exception_handlers
 from app.internal import admin
 from app.routers import anthropic, chat, models
@@ -13,9 +15,12 @@ def create_app() -> FastAPI:
         version="0.1.0",
         docs_url="/docs",
         redoc_url=None,
+        default_response_class=GatewayJSONResponse,
     )
 
     register_exception_handlers(app)
+    # Compresses larger JSON bodies; Starlette leaves text/event-stream as-is.
+    app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=6)
 
     app.include_router(models.router)
     app.include_router(chat.router)
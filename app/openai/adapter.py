@@ -1,18 +1,78 @@
 from __future__ import annotations
 
-import json
+import operator
 import time
 import uuid
 from dataclasses import dataclass
 from typing import Any, AsyncIterator
 
 from app.core.generation import generate_response_text, stream_response_deltas
-from app.core.token_estimation import estimate_tokens
+from app.core.prompt import build_conversation_prompt
+from app.core.serialization import JSON_SLOT, dumps_json, split_json_template
+from app.core.token_estimation import (
+    estimate_joined_tokens,
+    estimate_tokens,
+    estimate_tokens_from_char_count,
+)
 from app.core.types import CANONICAL_MODEL_ID, NormalizedGenerationRequest
 
 from .errors import OpenAICompatError, map_apple_fm_error
 from .schemas import ChatCompletionMessage, ChatCompletionRequest
 
+_ROLE_LABELS = {
+    "user": "User",
+    "assistant": "Assistant",
+}
+
+# Request fields that are accepted but not implemented (ignored with a warning).
+_IGNORED_FIELDS = (
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "frequency_penalty",
+    "presence_penalty",
+    "logprobs",
+    "n",
+    "stop",
+    "seed",
+    "user",
+    "parallel_tool_calls",
+    "metadata",
+)
+_get_ignored_fields = operator.attrgetter(*_IGNORED_FIELDS)
+
+# Stream frames that never change are encoded once at import time.
+_DONE_EVENT = b"data: [DONE]\n\n"
+_INITIAL_CHOICES = dumps_json(
+    [
+        {
+            "index": 0,
+            "delta": {"role": "assistant"},
+            "finish_reason": None,
+        }
+    ]
+)
+_FINAL_CHOICES = dumps_json(
+    [
+        {
+            "index": 0,
+            "delta": {},
+            "finish_reason": "stop",
+        }
+    ]
+)
+_CONTENT_CHOICES_PREFIX, _CONTENT_CHOICES_SUFFIX = split_json_template(
+    dumps_json(
+        [
+            {
+                "index": 0,
+                "delta": {"content": JSON_SLOT},
+                "finish_reason": None,
+            }
+        ]
+    )
+)
+
 
 @dataclass
 class PreparedChatRequest:
@@ -62,6 +122,7 @@ def prepare_chat_request(request: ChatCompletionRequest) -> PreparedChatRequest:
 
     warnings = _collect_warnings(request)
     warnings.extend(message_warnings)
+    stream_options = request.stream_options
 
     return PreparedChatRequest(
         model=request.model,
@@ -69,8 +130,8 @@ def prepare_chat_request(request: ChatCompletionRequest) -> PreparedChatRequest:
         prompt=prompt,
         prompt_tokens=prompt_tokens,
         json_schema=json_schema,
-        include_stream_usage=bool(
-            request.stream_options is not None and request.stream_options.include_usage
+        include_stream_usage=(
+            stream_options is not None and stream_options.include_usage
         ),
         warnings=_dedupe_preserve_order(warnings),
     )
@@ -135,58 +196,40 @@ async def create_chat_completion_stream(
         json_schema=prepared.json_schema,
     )
 
-    async def _iterator() -> AsyncIterator[bytes]:
-        completion_parts: list[str] = []
-        try:
-            initial = {
+    # Every chunk in this stream shares id/created/model; only choices vary.
+    chunk_head, chunk_tail = split_json_template(
+        _sse_data(
+            {
                 "id": completion_id,
                 "object": "chat.completion.chunk",
                 "created": created_at,
                 "model": prepared.model,
-                "choices": [
-                    {
-                        "index": 0,
-                        "delta": {"role": "assistant"},
-                        "finish_reason": None,
-                    }
-                ],
+                "choices": JSON_SLOT,
             }
-            yield _sse_data(initial)
+        )
+    )
 
-            async for delta in stream_response_deltas(normalized_request):
-                completion_parts.append(delta)
-                chunk = {
-                    "id": completion_id,
-                    "object": "chat.completion.chunk",
-                    "created": created_at,
-                    "model": prepared.model,
-                    "choices": [
-                        {
-                            "index": 0,
-                            "delta": {"content": delta},
-                            "finish_reason": None,
-                        }
-                    ],
-                }
-                yield _sse_data(chunk)
+    async def _iterator() -> AsyncIterator[bytes]:
+        completion_chars = 0
+        try:
+            yield chunk_head + _INITIAL_CHOICES + chunk_tail
 
-            final_chunk = {
-                "id": completion_id,
-                "object": "chat.completion.chunk",
-                "created": created_at,
-                "model": prepared.model,
-                "choices": [
-                    {
-                        "index": 0,
-                        "delta": {},
-                        "finish_reason": "stop",
-                    }
-                ],
-            }
-            yield _sse_data(final_chunk)
+            async for delta in stream_response_deltas(normalized_request):
+                completion_chars += len(delta)
+                yield b"".join(
+                    (
+                        chunk_head,
+                        _CONTENT_CHOICES_PREFIX,
+                        dumps_json(delta),
+                        _CONTENT_CHOICES_SUFFIX,
+                        chunk_tail,
+                    )
+                )
+
+            yield chunk_head + _FINAL_CHOICES + chunk_tail
 
             if prepared.include_stream_usage:
-                completion_tokens = estimate_tokens("".join(completion_parts))
+                completion_tokens = estimate_tokens_from_char_count(completion_chars)
                 usage_chunk = {
                     "id": completion_id,
                     "object": "chat.completion.chunk",
@@ -202,7 +245,7 @@ async def create_chat_completion_stream(
             yield _sse_data({"error": mapped.to_error()})
 
         finally:
-            yield b"data: [DONE]\n\n"
+            yield _DONE_EVENT
 
     return _iterator(), prepared.warnings
 
@@ -269,14 +312,16 @@ def _flatten_messages(
     warnings: list[str] = []
     instructions: list[str] = []
     dialogue_lines: list[str] = []
-    prompt_token_parts: list[str] = []
+    prompt_char_count = 0
+    prompt_part_count = 0
 
     for idx, message in enumerate(messages):
         role = message.role.lower()
         text, content_warnings = _extract_text_content(message, idx)
         warnings.extend(content_warnings)
         if text:
-            prompt_token_parts.append(text)
+            prompt_char_count += len(text)
+            prompt_part_count += 1
 
         if role in {"system", "developer"}:
             if text:
@@ -298,19 +343,13 @@ def _flatten_messages(
             param="messages",
         )
 
-    dialogue = "\n".join(dialogue_lines)
-    prompt = (
-        "Use the following conversation history to produce the next assistant message.\n\n"
-        "Conversation:\n"
-        f"{dialogue}\n\n"
-        "Assistant:"
-    )
+    prompt = build_conversation_prompt(dialogue_lines)
 
     merged_instructions = "\n\n".join(instructions) if instructions else None
     return (
         merged_instructions,
         prompt,
-        estimate_tokens("\n".join(prompt_token_parts)),
+        estimate_joined_tokens(prompt_char_count, prompt_part_count),
         warnings,
     )
 
@@ -331,13 +370,11 @@ def _extract_text_content(
     parts: list[str] = []
     ignored_non_text = False
 
+    # Parts are validated as dicts by ChatCompletionMessage.
     for part in content:
-        if not isinstance(part, dict):
-            ignored_non_text = True
-            continue
-
-        if part.get("type") == "text" and isinstance(part.get("text"), str):
-            parts.append(part["text"])
+        text = part.get("text")
+        if part.get("type") == "text" and isinstance(text, str):
+            parts.append(text)
         else:
             ignored_non_text = True
 
@@ -348,10 +385,9 @@ def _extract_text_content(
 
 
 def _role_label(role: str, message: ChatCompletionMessage) -> str:
-    if role == "user":
-        return "User"
-    if role == "assistant":
-        return "Assistant"
+    label = _ROLE_LABELS.get(role)
+    if label is not None:
+        return label
     if role in {"tool", "function"}:
         if message.name:
             return f"Tool({message.name})"
@@ -370,24 +406,11 @@ def _collect_warnings(request: ChatCompletionRequest) -> list[str]:
             "Received tools/tool_choice, but tool calling is ignored in v1."
         )
 
-    ignored_fields: list[str] = []
-    for field_name in (
-        "temperature",
-        "top_p",
-        "max_tokens",
-        "frequency_penalty",
-        "presence_penalty",
-        "logprobs",
-        "n",
-        "stop",
-        "seed",
-        "user",
-        "parallel_tool_calls",
-        "metadata",
-    ):
-        value = getattr(request, field_name)
-        if value is not None:
-            ignored_fields.append(field_name)
+    ignored_fields = [
+        field_name
+        for field_name, value in zip(_IGNORED_FIELDS, _get_ignored_fields(request))
+        if value is not None
+    ]
 
     if request.model_extra:
         ignored_fields.extend(sorted(request.model_extra.keys()))
@@ -414,17 +437,8 @@ def _new_chat_completion_id() -> str:
 
 
 def _sse_data(payload: dict[str, Any]) -> bytes:
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+    return b"data: " + dumps_json(payload) + b"\n\n"
 
 
 def _dedupe_preserve_order(items: list[str]) -> list[str]:
-    seen: set[str] = set()
-    deduped: list[str] = []
-
-    for item in items:
-        if item in seen:
-            continue
-        seen.add(item)
-        deduped.append(item)
-
-    return deduped
+    return list(dict.fromkeys(items))
@@ -5,7 +5,7 @@ import importlib.util
 from dataclasses import dataclass
 from typing import Any
 
-from app.core.errors import GatewayError
+from app.core.errors import GatewayError, lookup_fm_error
 
 fm: Any = None
 if importlib.util.find_spec("apple_fm_sdk") is not None:
@@ -32,6 +32,65 @@ class OpenAICompatError(Exception):
         }
 
 
+def build_fm_error_table(
+    sdk: Any,
+) -> dict[type, tuple[int, str, str, str | None]]:
+    """Map SDK exception classes to (status_code, error_type, code, param)."""
+
+    return {
+        sdk.ExceededContextWindowSizeError: (
+            400,
+            "invalid_request_error",
+            "context_length_exceeded",
+            None,
+        ),
+        sdk.InvalidGenerationSchemaError: (
+            400,
+            "invalid_request_error",
+            "invalid_json_schema",
+            "response_format",
+        ),
+        sdk.UnsupportedGuideError: (
+            400,
+            "invalid_request_error",
+            "unsupported_parameter",
+            None,
+        ),
+        sdk.UnsupportedLanguageOrLocaleError: (
+            400,
+            "invalid_request_error",
+            "unsupported_parameter",
+            None,
+        ),
+        sdk.GuardrailViolationError: (
+            400,
+            "invalid_request_error",
+            "content_policy_violation",
+            None,
+        ),
+        sdk.RefusalError: (
+            400,
+            "invalid_request_error",
+            "content_policy_violation",
+            None,
+        ),
+        sdk.RateLimitedError: (429, "rate_limit_error", "rate_limited", None),
+        sdk.ConcurrentRequestsError: (429, "rate_limit_error", "rate_limited", None),
+        sdk.AssetsUnavailableError: (503, "server_error", "assets_unavailable", None),
+        sdk.DecodingFailureError: (500, "server_error", "decoding_failure", None),
+        sdk.GenerationError: (500, "server_error", "generation_error", None),
+        sdk.FoundationModelsError: (
+            500,
+            "server_error",
+            "foundation_models_error",
+            None,
+        ),
+    }
+
+
+_FM_ERROR_MAP = build_fm_error_table(fm) if HAS_APPLE_FM_SDK else {}
+
+
 def map_apple_fm_error(exc: Exception) -> OpenAICompatError:
     """Map Foundation Models exceptions to OpenAI-style API errors."""
 
@@ -54,83 +113,15 @@ def map_apple_fm_error(exc: Exception) -> OpenAICompatError:
             param=exc.param,
         )
 
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.ExceededContextWindowSizeError):
-        return OpenAICompatError(
-            status_code=400,
-            message=str(exc),
-            error_type="invalid_request_error",
-            code="context_length_exceeded",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.InvalidGenerationSchemaError):
-        return OpenAICompatError(
-            status_code=400,
-            message=str(exc),
-            error_type="invalid_request_error",
-            code="invalid_json_schema",
-            param="response_format",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.UnsupportedGuideError, fm.UnsupportedLanguageOrLocaleError)
-    ):
-        return OpenAICompatError(
-            status_code=400,
-            message=str(exc),
-            error_type="invalid_request_error",
-            code="unsupported_parameter",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.GuardrailViolationError, fm.RefusalError)
-    ):
-        return OpenAICompatError(
-            status_code=400,
-            message=str(exc),
-            error_type="invalid_request_error",
-            code="content_policy_violation",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(
-        exc, (fm.RateLimitedError, fm.ConcurrentRequestsError)
-    ):
+    mapped = lookup_fm_error(exc, _FM_ERROR_MAP)
+    if mapped is not None:
+        status_code, error_type, code, param = mapped
         return OpenAICompatError(
-            status_code=429,
+            status_code=status_code,
             message=str(exc),
-            error_type="rate_limit_error",
-            code="rate_limited",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.AssetsUnavailableError):
-        return OpenAICompatError(
-            status_code=503,
-            message=str(exc),
-            error_type="server_error",
-            code="assets_unavailable",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.DecodingFailureError):
-        return OpenAICompatError(
-            status_code=500,
-            message=str(exc),
-            error_type="server_error",
-            code="decoding_failure",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.GenerationError):
-        return OpenAICompatError(
-            status_code=500,
-            message=str(exc),
-            error_type="server_error",
-            code="generation_error",
-        )
-
-    if HAS_APPLE_FM_SDK and isinstance(exc, fm.FoundationModelsError):
-        return OpenAICompatError(
-            status_code=500,
-            message=str(exc),
-            error_type="server_error",
-            code="foundation_models_error",
+            error_type=error_type,
+            code=code,
+            param=param,
         )
 
     return OpenAICompatError(
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 
 from app.anthropic.adapter import (
     count_tokens,
@@ -10,6 +10,7 @@ from app.anthropic.adapter import (
     warning_headers,
 )
 from app.anthropic.schemas import CountTokensRequest, MessagesRequest
+from app.core.responses import GatewayJSONResponse
 
 router = APIRouter(prefix="/v1", tags=["anthropic"])
 
@@ -20,6 +21,7 @@ async def messages(payload: MessagesRequest):
         iterator, warnings = await create_messages_stream(payload)
         headers = warning_headers(warnings)
         headers["Cache-Control"] = "no-cache"
+        headers["X-Accel-Buffering"] = "no"
 
         return StreamingResponse(
             iterator,
@@ -28,7 +30,10 @@ async def messages(payload: MessagesRequest):
         )
 
     response_payload, warnings = await create_messages_response(payload)
-    return JSONResponse(content=response_payload, headers=warning_headers(warnings))
+    return GatewayJSONResponse(
+        content=response_payload,
+        headers=warning_headers(warnings),
+    )
 
 
 @router.post("/messages/count_tokens")
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 
+from app.core.responses import GatewayJSONResponse
 from app.openai.adapter import (
     create_chat_completion,
     create_chat_completion_stream,
@@ -19,6 +20,7 @@ async def chat_completions(payload: ChatCompletionRequest):
         iterator, warnings = await create_chat_completion_stream(payload)
         headers = warning_headers(warnings)
         headers["Cache-Control"] = "no-cache"
+        headers["X-Accel-Buffering"] = "no"
 
         return StreamingResponse(
             iterator,
@@ -27,4 +29,7 @@ async def chat_completions(payload: ChatCompletionRequest):
         )
 
     response_payload, warnings = await create_chat_completion(payload)
-    return JSONResponse(content=response_payload, headers=warning_headers(warnings))
+    return GatewayJSONResponse(
+        content=response_payload,
+        headers=warning_headers(warnings),
+    )
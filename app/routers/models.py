@@ -1,15 +1,21 @@
 from __future__ import annotations
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
+from app.core.serialization import dumps_json
 from app.openai.adapter import canonical_model_card
 
 router = APIRouter(prefix="/v1", tags=["openai"])
 
-
-@router.get("/models")
-async def list_models() -> dict:
-    return {
+# The model list never changes at runtime, so it is serialized once.
+_MODEL_LIST_BODY = dumps_json(
+    {
         "object": "list",
         "data": [canonical_model_card()],
     }
+)
+
+
+@router.get("/models")
+async def list_models() -> Response:
+    return Response(content=_MODEL_LIST_BODY, media_type="application/json")
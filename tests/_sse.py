@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+
+@dataclass
+class SSEStream:
+    event_names: list[str] = field(default_factory=list)
+    chunks: list[dict[str, Any]] = field(default_factory=list)
+    done: bool = False
+
+
+def parse_sse_body(body: bytes) -> SSEStream:
+    """Parse a raw SSE body, stopping at the ``[DONE]`` sentinel."""
+
+    stream = SSEStream()
+    for line in body.splitlines():
+        if line.startswith(b"event: "):
+            stream.event_names.append(line.removeprefix(b"event: ").decode())
+            continue
+
+        if not line.startswith(b"data: "):
+            continue
+
+        raw_payload = line.removeprefix(b"data: ")
+        if raw_payload == b"[DONE]":
+            stream.done = True
+            break
+        stream.chunks.append(json.loads(raw_payload))
+
+    return stream
+
+
+def collect_sse_chunks(response: httpx.Response) -> SSEStream:
+    return parse_sse_body(response.read())
+
+
+async def acollect_sse_chunks(response: httpx.Response) -> SSEStream:
+    return parse_sse_body(await response.aread())
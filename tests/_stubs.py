@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+from types import ModuleType, SimpleNamespace
+from typing import Any
+
+import pytest
+
+import app.anthropic.adapter as anthropic_adapter
+import app.core.generation as generation
+import app.openai.adapter as openai_adapter
+
+
+def patch_generation(
+    monkeypatch: pytest.MonkeyPatch,
+    module: ModuleType,
+    text: Callable[[Any], str],
+    deltas: tuple[str, ...],
+) -> dict[str, Any]:
+    """Stub an adapter's generation calls and record the request they receive."""
+
+    captured: dict[str, Any] = {
+        "request": None,
+    }
+
+    async def fake_generate_response_text(request):
+        captured["request"] = request
+        return text(request)
+
+    async def fake_stream_response_deltas(request):
+        captured["request"] = request
+        for delta in deltas:
+            yield delta
+
+    monkeypatch.setattr(module, "generate_response_text", fake_generate_response_text)
+    monkeypatch.setattr(module, "stream_response_deltas", fake_stream_response_deltas)
+
+    return captured
+
+
+def _openai_stub_text(request) -> str:
+    if request.json_schema is not None:
+        return json.dumps({"ok": True, "mode": "json_schema"})
+    return "stub completion"
+
+
+def stub_openai_generation(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    return patch_generation(
+        monkeypatch,
+        openai_adapter,
+        _openai_stub_text,
+        ("s", "t", "ub"),
+    )
+
+
+def stub_anthropic_generation(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    return patch_generation(
+        monkeypatch,
+        anthropic_adapter,
+        lambda _request: "anthropic stub completion",
+        ("Hello", " ", "world"),
+    )
+
+
+def stub_apple_fm_sdk(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    """Swap in a fake apple_fm_sdk for app.core.generation and count its calls."""
+
+    state: dict[str, Any] = {
+        "model_calls": 0,
+        "availability_calls": 0,
+        "availability": (True, None),
+        "snapshots": [],
+    }
+
+    class FakeSystemLanguageModel:
+        def __init__(self):
+            state["model_calls"] += 1
+
+        def is_available(self):
+            state["availability_calls"] += 1
+            return state["availability"]
+
+    class FakeLanguageModelSession:
+        def __init__(self, instructions=None, model=None):
+            self.model = model
+
+        async def respond(self, prompt):
+            return "fake completion"
+
+        async def stream_response(self, prompt):
+            for snapshot in state["snapshots"]:
+                yield snapshot
+
+    fake_fm = SimpleNamespace(
+        SystemLanguageModel=FakeSystemLanguageModel,
+        LanguageModelSession=FakeLanguageModelSession,
+    )
+    monkeypatch.setattr(generation, "fm", fake_fm)
+    monkeypatch.setattr(generation, "HAS_APPLE_FM_SDK", True)
+
+    return state
+
+
+_FM_ERROR_NAMES = (
+    "ExceededContextWindowSizeError",
+    "InvalidGenerationSchemaError",
+    "UnsupportedGuideError",
+    "UnsupportedLanguageOrLocaleError",
+    "GuardrailViolationError",
+    "RefusalError",
+    "RateLimitedError",
+    "ConcurrentRequestsError",
+    "AssetsUnavailableError",
+    "DecodingFailureError",
+)
+
+
+def fake_fm_errors() -> SimpleNamespace:
+    """Stand-in for the SDK's exception classes, for building error tables."""
+
+    base = type("FoundationModelsError", (Exception,), {})
+    generation_error = type("GenerationError", (base,), {})
+    errors = {name: type(name, (generation_error,), {}) for name in _FM_ERROR_NAMES}
+    return SimpleNamespace(
+        FoundationModelsError=base,
+        GenerationError=generation_error,
+        **errors,
+    )
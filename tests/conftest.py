@@ -1,8 +1,75 @@
 from __future__ import annotations
 
 import sys
+from collections.abc import AsyncIterator, Iterator
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app.core.generation as generation  # noqa: E402
+
+# The module-level app is built once on import; tests share it rather than
+# paying for a second create_app().
+from app.main import app as _APP  # noqa: E402
+from tests._stubs import (  # noqa: E402
+    stub_anthropic_generation,
+    stub_apple_fm_sdk,
+    stub_openai_generation,
+)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    with TestClient(_APP) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+async def async_client(anyio_backend) -> AsyncIterator[httpx.AsyncClient]:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=_APP),
+        base_url="http://testserver",
+    ) as async_test_client:
+        yield async_test_client
+
+
+@pytest.fixture()
+def patch_generation_success(monkeypatch):
+    return stub_openai_generation(monkeypatch)
+
+
+@pytest.fixture()
+def patch_anthropic_generation(monkeypatch):
+    return stub_anthropic_generation(monkeypatch)
+
+
+@pytest.fixture()
+def fake_apple_fm(monkeypatch):
+    generation.reset_model_cache()
+    yield stub_apple_fm_sdk(monkeypatch)
+    generation.reset_model_cache()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warmup(client: TestClient) -> None:
+    client.get("/v1/models")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        stub_openai_generation(monkeypatch)
+        client.post(
+            "/v1/chat/completions",
+            json={
+                "model": "apple.fm.system",
+                "messages": [{"role": "user", "content": "warmup"}],
+            },
+        )
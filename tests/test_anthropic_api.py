@@ -1,45 +1,19 @@
 from __future__ import annotations
 
+from typing import Any
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 
 import app.anthropic.adapter as anthropic_adapter
+import app.anthropic.errors as anthropic_errors
 from app.core.errors import GatewayError
-from app.main import create_app
-
-
-@pytest.fixture()
-def client() -> TestClient:
-    return TestClient(create_app())
-
-
-@pytest.fixture()
-def patch_anthropic_generation(monkeypatch):
-    captured = {
-        "request": None,
-    }
-
-    async def fake_generate_response_text(request):
-        captured["request"] = request
-        return "anthropic stub completion"
-
-    async def fake_stream_response_deltas(request):
-        captured["request"] = request
-        for delta in ("Hello", " ", "world"):
-            yield delta
-
-    monkeypatch.setattr(
-        anthropic_adapter,
-        "generate_response_text",
-        fake_generate_response_text,
-    )
-    monkeypatch.setattr(
-        anthropic_adapter,
-        "stream_response_deltas",
-        fake_stream_response_deltas,
-    )
+from app.core.token_estimation import estimate_tokens
+from tests._sse import SSEStream, acollect_sse_chunks, collect_sse_chunks
+from tests._stubs import fake_fm_errors, stub_anthropic_generation
 
-    return captured
+_HI_MESSAGES = [{"role": "user", "content": [{"type": "text", "text": "Hi"}]}]
 
 
 def test_messages_non_stream_success(client: TestClient, patch_anthropic_generation):
@@ -72,12 +46,23 @@ def test_messages_non_stream_success(client: TestClient, patch_anthropic_generat
     assert request.instructions == "You are concise."
     assert "User: Say hello." in request.conversation_prompt
 
-    warnings = response.headers.get("x-anthropic-compat-warnings")
-    assert warnings is not None
-    assert "Mapped model 'sonnet'" in warnings
+    assert "Mapped model 'sonnet'" in response.headers["x-anthropic-compat-warnings"]
+
+
+_STREAM_EVENT_NAMES = [
+    "message_start",
+    "content_block_start",
+    "content_block_delta",
+    "content_block_delta",
+    "content_block_delta",
+    "content_block_stop",
+    "message_delta",
+    "message_stop",
+]
 
 
-def test_messages_streaming_events(client: TestClient, patch_anthropic_generation):
+@pytest.fixture(scope="module")
+async def anthropic_stream(anyio_backend, async_client: httpx.AsyncClient) -> SSEStream:
     payload = {
         "model": "haiku",
         "stream": True,
@@ -89,16 +74,54 @@ def test_messages_streaming_events(client: TestClient, patch_anthropic_generatio
         ],
     }
 
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        stub_anthropic_generation(monkeypatch)
+        async with async_client.stream(
+            "POST", "/v1/messages", json=payload
+        ) as response:
+            assert response.status_code == 200
+            return await acollect_sse_chunks(response)
+
+
+def test_messages_stream_event_order(anthropic_stream: SSEStream):
+    assert anthropic_stream.event_names == _STREAM_EVENT_NAMES
+
+
+def test_messages_stream_reports_output_tokens(anthropic_stream: SSEStream):
+    message_delta = next(
+        chunk for chunk in anthropic_stream.chunks if chunk["type"] == "message_delta"
+    )
+    assert message_delta["usage"] == {"output_tokens": estimate_tokens("Hello world")}
+
+
+def test_messages_streaming_text_deltas_are_valid_json(client: TestClient, monkeypatch):
+    async def fake_stream_response_deltas(_request):
+        for delta in ('Say "hi"', "\n", "caf\u00e9 \\ done"):
+            yield delta
+
+    monkeypatch.setattr(
+        anthropic_adapter,
+        "stream_response_deltas",
+        fake_stream_response_deltas,
+    )
+
+    payload = {
+        "model": "haiku",
+        "stream": True,
+        "messages": [{"role": "user", "content": "Stream please."}],
+    }
+
     with client.stream("POST", "/v1/messages", json=payload) as response:
-        body = "".join(response.iter_text())
+        events = collect_sse_chunks(response).chunks
 
     assert response.status_code == 200
-    assert "event: message_start" in body
-    assert "event: content_block_start" in body
-    assert "event: content_block_delta" in body
-    assert "event: content_block_stop" in body
-    assert "event: message_delta" in body
-    assert "event: message_stop" in body
+    deltas = [event for event in events if event["type"] == "content_block_delta"]
+    assert all(event["index"] == 0 for event in deltas)
+    assert all(event["delta"]["type"] == "text_delta" for event in deltas)
+    assert "".join(event["delta"]["text"] for event in deltas) == (
+        'Say "hi"\ncaf\u00e9 \\ done'
+    )
+    assert events[-1] == {"type": "message_stop"}
 
 
 def test_count_tokens_returns_deterministic_value(client: TestClient):
@@ -123,55 +146,97 @@ def test_count_tokens_returns_deterministic_value(client: TestClient):
     body = response.json()
     # text length is deterministic and should be > 0 for this payload
     assert body["input_tokens"] > 0
+    assert body["input_tokens"] == estimate_tokens("A\nabcd\nefgh")
 
 
-def test_model_alias_and_claude_prefix_mapping(
+def test_messages_usage_matches_count_tokens(
     client: TestClient, patch_anthropic_generation
 ):
     payload = {
-        "model": "claude-3-5-sonnet-latest",
-        "messages": [{"role": "user", "content": [{"type": "text", "text": "Hi"}]}],
+        "model": "sonnet",
+        "system": "You are concise.",
+        "messages": [
+            {"role": "user", "content": [{"type": "text", "text": "First"}]},
+            {"role": "assistant", "content": "Prior answer"},
+            {"role": "user", "content": "Second"},
+        ],
     }
 
     response = client.post("/v1/messages", json=payload)
+    count_response = client.post("/v1/messages/count_tokens", json=payload)
 
     assert response.status_code == 200
-    request = patch_anthropic_generation["request"]
-    assert request is not None
-    assert request.resolved_model == "apple.fm.system"
+    assert count_response.status_code == 200
+    assert (
+        response.json()["usage"]["input_tokens"]
+        == count_response.json()["input_tokens"]
+    )
 
 
-def test_unknown_model_returns_400(client: TestClient):
+def test_model_alias_and_claude_prefix_mapping(
+    client: TestClient, patch_anthropic_generation
+):
     payload = {
-        "model": "gpt-4.1",
-        "messages": [{"role": "user", "content": [{"type": "text", "text": "Hi"}]}],
+        "model": "claude-3-5-sonnet-latest",
+        "messages": _HI_MESSAGES,
     }
 
     response = client.post("/v1/messages", json=payload)
 
-    assert response.status_code == 400
-    body = response.json()
-    assert body["type"] == "error"
-    assert body["error"]["type"] == "invalid_request_error"
+    assert response.status_code == 200
+    request = patch_anthropic_generation["request"]
+    assert request is not None
+    assert request.resolved_model == "apple.fm.system"
 
 
-def test_unsupported_content_block_returns_400(client: TestClient):
-    payload = {
-        "model": "sonnet",
-        "messages": [
+@pytest.mark.parametrize(
+    ("payload", "expected_message"),
+    [
+        pytest.param(
+            {"model": "gpt-4.1", "messages": _HI_MESSAGES},
+            "Unknown model 'gpt-4.1'",
+            id="unknown-model",
+        ),
+        pytest.param(
             {
-                "role": "user",
-                "content": [{"type": "image", "source": "abc"}],
-            }
-        ],
-    }
-
+                "model": "sonnet",
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [{"type": "image", "source": "abc"}],
+                    }
+                ],
+            },
+            "Only 'text' blocks",
+            id="unsupported-content-block",
+        ),
+        pytest.param(
+            {
+                "model": "sonnet",
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [{"type": "text", "text": "Hi"}, {"type": "text"}],
+                    }
+                ],
+            },
+            "Text block in messages[0].content must include 'text'.",
+            id="text-block-without-text",
+        ),
+    ],
+)
+def test_invalid_request_returns_400(
+    client: TestClient,
+    payload: dict[str, Any],
+    expected_message: str,
+):
     response = client.post("/v1/messages", json=payload)
 
     assert response.status_code == 400
     body = response.json()
     assert body["type"] == "error"
-    assert "Only 'text' blocks" in body["error"]["message"]
+    assert body["error"]["type"] == "invalid_request_error"
+    assert expected_message in body["error"]["message"]
 
 
 def test_system_block_array_is_supported(
@@ -183,7 +248,7 @@ def test_system_block_array_is_supported(
             {"type": "text", "text": "System A. "},
             {"type": "text", "text": "System B."},
         ],
-        "messages": [{"role": "user", "content": [{"type": "text", "text": "Hi"}]}],
+        "messages": _HI_MESSAGES,
     }
 
     response = client.post("/v1/messages", json=payload)
@@ -219,3 +284,40 @@ def test_backend_unavailable_maps_to_503(client: TestClient, monkeypatch):
     body = response.json()
     assert body["type"] == "error"
     assert body["error"]["type"] == "api_error"
+
+
+def test_sdk_error_maps_to_anthropic_error(monkeypatch):
+    sdk = fake_fm_errors()
+    monkeypatch.setattr(
+        anthropic_errors, "_FM_ERROR_MAP", anthropic_errors.build_fm_error_table(sdk)
+    )
+
+    mapped = anthropic_errors.map_anthropic_error(sdk.RefusalError("Refused"))
+
+    assert mapped == anthropic_errors.AnthropicCompatError(
+        status_code=400,
+        message="Refused",
+        error_type="invalid_request_error",
+    )
+
+
+def test_sdk_rate_limit_error_returns_429(client: TestClient, monkeypatch):
+    sdk = fake_fm_errors()
+    monkeypatch.setattr(
+        anthropic_errors, "_FM_ERROR_MAP", anthropic_errors.build_fm_error_table(sdk)
+    )
+
+    async def failing_generate(_request):
+        raise sdk.ConcurrentRequestsError("Too many requests")
+
+    monkeypatch.setattr(anthropic_adapter, "generate_response_text", failing_generate)
+
+    response = client.post(
+        "/v1/messages", json={"model": "sonnet", "messages": _HI_MESSAGES}
+    )
+
+    assert response.status_code == 429
+    assert response.json() == {
+        "type": "error",
+        "error": {"type": "rate_limit_error", "message": "Too many requests"},
+    }
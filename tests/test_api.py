@@ -1,43 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import json
+from types import SimpleNamespace
 from typing import Any, cast
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 
+import app.core.generation as generation
+import app.core.serialization as serialization
 import app.openai.adapter as adapter
-from app.core.errors import GatewayError
+import app.openai.errors as openai_errors
+from app.core.errors import GatewayError, lookup_fm_error
 from app.core.token_estimation import estimate_tokens
-from app.main import create_app
-
-
-@pytest.fixture()
-def client() -> TestClient:
-    return TestClient(create_app())
-
-
-@pytest.fixture()
-def patch_generation_success(monkeypatch):
-    captured = {
-        "request": None,
-    }
-
-    async def fake_generate_response_text(request):
-        captured["request"] = request
-        if request.json_schema is not None:
-            return json.dumps({"ok": True, "mode": "json_schema"})
-        return "stub completion"
-
-    async def fake_stream_response_deltas(request):
-        captured["request"] = request
-        for delta in ("s", "t", "ub"):
-            yield delta
-
-    monkeypatch.setattr(adapter, "generate_response_text", fake_generate_response_text)
-    monkeypatch.setattr(adapter, "stream_response_deltas", fake_stream_response_deltas)
-
-    return captured
+from tests._sse import acollect_sse_chunks, collect_sse_chunks
+from tests._stubs import fake_fm_errors
+
+_HELLO_PAYLOAD = {
+    "model": "apple.fm.system",
+    "messages": [{"role": "user", "content": "Hello"}],
+}
+_STREAM_PAYLOAD = {
+    "model": "apple.fm.system",
+    "stream": True,
+    "messages": [{"role": "user", "content": "Stream please"}],
+}
+
+# "Stream please" prompt and the "s" + "t" + "ub" stub deltas.
+_STREAM_PROMPT_TOKENS = estimate_tokens("Stream please")
+_STREAM_COMPLETION_TOKENS = estimate_tokens("stub")
+# "stub completion" non-stream reply to the "Hello" and text-only prompts.
+_COMPLETION_TOKENS = estimate_tokens("stub completion")
+_HELLO_PROMPT_TOKENS = estimate_tokens("Hello")
+_TEXT_ONLY_PROMPT_TOKENS = estimate_tokens("Rule\nPolicy\nHi\nAck")
 
 
 def test_models_endpoint_returns_canonical_model(client: TestClient):
@@ -53,12 +50,7 @@ def test_chat_completion_non_stream_success(
     client: TestClient,
     patch_generation_success,
 ):
-    payload = {
-        "model": "apple.fm.system",
-        "messages": [{"role": "user", "content": "Hello"}],
-    }
-
-    response = client.post("/v1/chat/completions", json=payload)
+    response = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD)
 
     assert response.status_code == 200
     body = response.json()
@@ -66,12 +58,10 @@ def test_chat_completion_non_stream_success(
     assert body["model"] == "apple.fm.system"
     assert body["choices"][0]["message"]["role"] == "assistant"
     assert body["choices"][0]["message"]["content"] == "stub completion"
-    expected_prompt_tokens = estimate_tokens("Hello")
-    expected_completion_tokens = estimate_tokens("stub completion")
     assert body["usage"] == {
-        "prompt_tokens": expected_prompt_tokens,
-        "completion_tokens": expected_completion_tokens,
-        "total_tokens": expected_prompt_tokens + expected_completion_tokens,
+        "prompt_tokens": _HELLO_PROMPT_TOKENS,
+        "completion_tokens": _COMPLETION_TOKENS,
+        "total_tokens": _HELLO_PROMPT_TOKENS + _COMPLETION_TOKENS,
     }
 
 
@@ -102,28 +92,18 @@ def test_chat_completion_flattens_messages_into_prompt(
     assert request.conversation_prompt.endswith("Assistant:")
 
 
-def test_chat_completion_streaming_sse(
-    client: TestClient,
+@pytest.mark.anyio
+async def test_chat_completion_streaming_sse(
+    async_client: httpx.AsyncClient,
     patch_generation_success,
 ):
-    payload = {
-        "model": "apple.fm.system",
-        "stream": True,
-        "messages": [{"role": "user", "content": "Stream please"}],
-    }
-
-    with client.stream("POST", "/v1/chat/completions", json=payload) as response:
-        body = "".join(response.iter_text())
+    async with async_client.stream(
+        "POST", "/v1/chat/completions", json=_STREAM_PAYLOAD
+    ) as response:
+        stream = await acollect_sse_chunks(response)
 
     assert response.status_code == 200
-    chunks: list[dict[str, object]] = []
-    for line in body.splitlines():
-        if not line.startswith("data: "):
-            continue
-        raw_payload = line.removeprefix("data: ")
-        if raw_payload == "[DONE]":
-            continue
-        chunks.append(json.loads(raw_payload))
+    chunks = stream.chunks
 
     assert chunks
     assert all(chunk.get("object") == "chat.completion.chunk" for chunk in chunks)
@@ -144,43 +124,66 @@ def test_chat_completion_streaming_sse(
             break
 
     assert has_stop_choice
-    assert "data: [DONE]" in body
+    assert stream.done
 
 
-def test_chat_completion_streaming_includes_usage_when_requested(
+def test_chat_completion_compresses_large_json_but_not_sse(
     client: TestClient,
+    monkeypatch,
+):
+    long_completion = "word " * 200
+
+    async def fake_generate_response_text(_request):
+        return long_completion
+
+    async def fake_stream_response_deltas(_request):
+        yield long_completion
+
+    monkeypatch.setattr(adapter, "generate_response_text", fake_generate_response_text)
+    monkeypatch.setattr(adapter, "stream_response_deltas", fake_stream_response_deltas)
+    headers = {"Accept-Encoding": "gzip"}
+
+    response = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD, headers=headers)
+    with client.stream(
+        "POST",
+        "/v1/chat/completions",
+        json={**_HELLO_PAYLOAD, "stream": True},
+        headers=headers,
+    ) as stream_response:
+        stream_response.read()
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["choices"][0]["message"]["content"] == long_completion
+    assert "content-encoding" not in stream_response.headers
+    assert stream_response.headers["x-accel-buffering"] == "no"
+
+
+@pytest.mark.anyio
+async def test_chat_completion_streaming_includes_usage_when_requested(
+    async_client: httpx.AsyncClient,
     patch_generation_success,
 ):
-    payload = {
-        "model": "apple.fm.system",
-        "stream": True,
-        "stream_options": {"include_usage": True},
-        "messages": [{"role": "user", "content": "Stream please"}],
-    }
+    payload = {**_STREAM_PAYLOAD, "stream_options": {"include_usage": True}}
 
-    with client.stream("POST", "/v1/chat/completions", json=payload) as response:
-        body = "".join(response.iter_text())
+    async with async_client.stream(
+        "POST", "/v1/chat/completions", json=payload
+    ) as response:
+        stream = await acollect_sse_chunks(response)
 
     assert response.status_code == 200
-    chunks: list[dict[str, object]] = []
-    for line in body.splitlines():
-        if not line.startswith("data: "):
-            continue
-        raw_payload = line.removeprefix("data: ")
-        if raw_payload == "[DONE]":
-            continue
-        chunks.append(json.loads(raw_payload))
+    chunks = stream.chunks
 
     usage_chunks = [chunk for chunk in chunks if "usage" in chunk]
     assert len(usage_chunks) == 1
     usage_chunk = usage_chunks[0]
     assert usage_chunk["choices"] == []
     assert usage_chunk["usage"] == {
-        "prompt_tokens": estimate_tokens("Stream please"),
-        "completion_tokens": estimate_tokens("stub"),
-        "total_tokens": estimate_tokens("Stream please") + estimate_tokens("stub"),
+        "prompt_tokens": _STREAM_PROMPT_TOKENS,
+        "completion_tokens": _STREAM_COMPLETION_TOKENS,
+        "total_tokens": _STREAM_PROMPT_TOKENS + _STREAM_COMPLETION_TOKENS,
     }
-    assert "data: [DONE]" in body
+    assert stream.done
 
 
 def test_chat_completion_usage_counts_text_only_prompt_content(
@@ -210,17 +213,36 @@ def test_chat_completion_usage_counts_text_only_prompt_content(
 
     assert response.status_code == 200
     body = response.json()
-    expected_prompt_tokens = estimate_tokens("Rule\nPolicy\nHi\nAck")
-    expected_completion_tokens = estimate_tokens("stub completion")
     assert body["usage"] == {
-        "prompt_tokens": expected_prompt_tokens,
-        "completion_tokens": expected_completion_tokens,
-        "total_tokens": expected_prompt_tokens + expected_completion_tokens,
+        "prompt_tokens": _TEXT_ONLY_PROMPT_TOKENS,
+        "completion_tokens": _COMPLETION_TOKENS,
+        "total_tokens": _TEXT_ONLY_PROMPT_TOKENS + _COMPLETION_TOKENS,
+    }
+
+    assert (
+        "Ignored non-text content parts in messages[2]."
+        in response.headers["x-openai-compat-warnings"]
+    )
+
+
+def test_chat_completion_warns_about_ignored_fields(
+    client: TestClient,
+    patch_generation_success,
+):
+    payload = {
+        "model": "apple.fm.system",
+        "messages": [{"role": "user", "content": "Hello"}],
+        "temperature": 0.2,
+        "seed": 7,
+        "logit_bias": {"42": 1},
     }
 
-    warnings = response.headers.get("x-openai-compat-warnings")
-    assert warnings is not None
-    assert "Ignored non-text content parts in messages[2]." in warnings
+    response = client.post("/v1/chat/completions", json=payload)
+
+    assert response.status_code == 200
+    assert response.headers["x-openai-compat-warnings"] == (
+        "Ignored unsupported request fields: temperature, seed, logit_bias"
+    )
 
 
 def test_chat_completion_json_schema_mode(
@@ -256,39 +278,41 @@ def test_chat_completion_json_schema_mode(
     assert parsed["ok"] is True
 
 
-def test_chat_completion_json_schema_stream_returns_400(client: TestClient):
-    payload = {
-        "model": "apple.fm.system",
-        "stream": True,
-        "messages": [{"role": "user", "content": "Return object"}],
-        "response_format": {
-            "type": "json_schema",
-            "json_schema": {
-                "name": "Demo",
-                "schema": {"type": "object", "properties": {}},
+@pytest.mark.parametrize(
+    ("payload", "expected_error"),
+    [
+        pytest.param(
+            {
+                **_STREAM_PAYLOAD,
+                "messages": [{"role": "user", "content": "Return object"}],
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "Demo",
+                        "schema": {"type": "object", "properties": {}},
+                    },
+                },
             },
-        },
-    }
-
-    response = client.post("/v1/chat/completions", json=payload)
-
-    assert response.status_code == 400
-    body = response.json()
-    assert "error" in body
-    assert body["error"]["type"] == "invalid_request_error"
-
-
-def test_chat_completion_invalid_model_returns_400(client: TestClient):
-    payload = {
-        "model": "not-supported",
-        "messages": [{"role": "user", "content": "Hello"}],
-    }
-
+            {"type": "invalid_request_error"},
+            id="json-schema-stream",
+        ),
+        pytest.param(
+            {**_HELLO_PAYLOAD, "model": "not-supported"},
+            {"type": "invalid_request_error", "code": "model_not_found"},
+            id="invalid-model",
+        ),
+    ],
+)
+def test_chat_completion_invalid_request_returns_400(
+    client: TestClient,
+    payload: dict[str, Any],
+    expected_error: dict[str, str],
+):
     response = client.post("/v1/chat/completions", json=payload)
 
     assert response.status_code == 400
-    body = response.json()
-    assert body["error"]["code"] == "model_not_found"
+    error = response.json()["error"]
+    assert {key: error[key] for key in expected_error} == expected_error
 
 
 def test_chat_completion_model_unavailable_returns_503(client: TestClient, monkeypatch):
@@ -301,13 +325,158 @@ def test_chat_completion_model_unavailable_returns_503(client: TestClient, monke
 
     monkeypatch.setattr(adapter, "generate_response_text", failing_generate)
 
-    payload = {
-        "model": "apple.fm.system",
-        "messages": [{"role": "user", "content": "Hello"}],
-    }
-
-    response = client.post("/v1/chat/completions", json=payload)
+    response = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD)
 
     assert response.status_code == 503
     body = response.json()
     assert body["error"]["code"] == "model_unavailable"
+
+
+def test_sdk_error_maps_to_openai_error(monkeypatch):
+    sdk = fake_fm_errors()
+    monkeypatch.setattr(
+        openai_errors, "_FM_ERROR_MAP", openai_errors.build_fm_error_table(sdk)
+    )
+
+    mapped = openai_errors.map_apple_fm_error(
+        sdk.InvalidGenerationSchemaError("Bad schema")
+    )
+
+    assert mapped.status_code == 400
+    assert mapped.message == "Bad schema"
+    assert mapped.error_type == "invalid_request_error"
+    assert mapped.code == "invalid_json_schema"
+    assert mapped.param == "response_format"
+
+
+@pytest.mark.parametrize(
+    ("error_name", "expected"),
+    [
+        ("ConcurrentRequestsError", (429, "rate_limit_error", "rate_limited", None)),
+        ("GenerationError", (500, "server_error", "generation_error", None)),
+        (
+            "FoundationModelsError",
+            (500, "server_error", "foundation_models_error", None),
+        ),
+    ],
+)
+def test_sdk_error_subclasses_match_nearest_table_entry(
+    error_name: str,
+    expected: tuple[int, str, str, str | None],
+):
+    sdk = fake_fm_errors()
+    raised = type("RaisedError", (getattr(sdk, error_name),), {})("boom")
+
+    table = openai_errors.build_fm_error_table(sdk)
+
+    assert lookup_fm_error(raised, table) == expected
+
+
+def test_system_model_and_availability_are_reused(
+    client: TestClient,
+    fake_apple_fm,
+):
+    for _ in range(3):
+        response = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD)
+        assert response.status_code == 200
+        assert response.json()["choices"][0]["message"]["content"] == (
+            "fake completion"
+        )
+
+    assert fake_apple_fm["model_calls"] == 1
+    assert fake_apple_fm["availability_calls"] == 1
+
+
+def test_unavailable_model_is_rechecked_after_ttl(
+    client: TestClient,
+    fake_apple_fm,
+    monkeypatch,
+):
+    now = [1000.0]
+    monkeypatch.setattr(generation, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    fake_apple_fm["availability"] = (False, "MODEL_NOT_READY")
+
+    unavailable = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD)
+
+    fake_apple_fm["availability"] = (True, None)
+    now[0] += 5.1
+    available = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD)
+
+    assert unavailable.status_code == 503
+    assert unavailable.json()["error"]["code"] == "model_unavailable"
+    assert available.status_code == 200
+    assert fake_apple_fm["availability_calls"] == 2
+
+
+def test_synchronous_sdk_respond_runs_off_the_event_loop(
+    client: TestClient,
+    fake_apple_fm,
+    monkeypatch,
+):
+    respond_calls: list[bool] = []
+
+    class BlockingLanguageModelSession:
+        def __init__(self, instructions=None, model=None):
+            self.model = model
+
+        def respond(self, prompt):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                respond_calls.append(False)
+            else:
+                respond_calls.append(True)
+            return "blocking completion"
+
+    monkeypatch.setattr(
+        generation.fm, "LanguageModelSession", BlockingLanguageModelSession
+    )
+
+    response = client.post("/v1/chat/completions", json=_HELLO_PAYLOAD)
+
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"] == (
+        "blocking completion"
+    )
+    # respond() ran exactly once, and not on the event loop thread.
+    assert respond_calls == [False]
+
+
+@pytest.mark.parametrize(
+    ("snapshots", "expected_deltas"),
+    [
+        (["He", "Hello", "Hello", "Hello world"], ["He", "llo", " world"]),
+        (["abc", "abd", "x"], ["abc", "abd", "x"]),
+        (["Hello wor", "Jello world"], ["Hello wor", "Jello world"]),
+    ],
+    ids=["cumulative", "restarted", "diverged-mid-string"],
+)
+def test_streaming_deltas_from_sdk_snapshots(
+    client: TestClient,
+    fake_apple_fm,
+    snapshots: list[str],
+    expected_deltas: list[str],
+):
+    fake_apple_fm["snapshots"] = snapshots
+
+    with client.stream(
+        "POST", "/v1/chat/completions", json=_STREAM_PAYLOAD
+    ) as response:
+        chunks = collect_sse_chunks(response).chunks
+
+    assert response.status_code == 200
+    deltas = [
+        choice["delta"]["content"]
+        for chunk in chunks
+        for choice in chunk["choices"]
+        if "content" in choice["delta"]
+    ]
+
+    assert deltas == expected_deltas
+
+
+def test_stdlib_json_fallback_rejects_nan(monkeypatch):
+    monkeypatch.setattr(serialization, "HAS_ORJSON", False)
+
+    with pytest.raises(ValueError):
+        serialization.dumps_json({"value": float("nan")})